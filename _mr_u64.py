@@ -0,0 +1,79 @@
+"""
+Numba-compiled Miller-Rabin for numbers below 2^32.
+
+test_carmichael.py runs miller_rabin max_k * trials times on small
+Carmichael numbers; compiling the whole trial loop removes the interpreter
+overhead. Residues are below 2^32, so every product fits in a uint64.
+"""
+import numba
+import numpy as np
+
+ONE = np.uint64(1)
+TWO = np.uint64(2)
+
+
+@numba.njit(cache=True)
+def mod_exp_u64(x, y, N):
+    """x^y mod N with uint64 arithmetic (right-to-left binary)"""
+    result = ONE
+    x = x % N
+    while y > 0:
+        if y & ONE:
+            result = (result * x) % N
+        x = (x * x) % N
+        y >>= ONE
+    return result
+
+
+@numba.njit(cache=True)
+def miller_rabin_u64(N, k):
+    """
+    Returns True if N is prime. The random-witness form of
+    prime_number_generation.miller_rabin, restricted to N < 2^32; the
+    Carmichael experiments measure how often random witnesses are fooled,
+    so the fixed deterministic witness sets are not used here
+    """
+    if N <= 1:
+        return False
+    if N <= 3:
+        return True
+    if N % 2 == 0:
+        return False
+
+    n = np.uint64(N)
+    n_minus_1 = n - ONE
+    t = 0
+    u = n_minus_1
+    while u % TWO == 0:
+        u = u // TWO
+        t += 1
+
+    for _ in range(k):
+        # randint's upper bound is exclusive, so a is in [2, N-2]
+        a = np.uint64(np.random.randint(2, N - 1))
+        x = mod_exp_u64(a, u, n)
+
+        if x == ONE or x == n_minus_1:
+            continue
+
+        found = False
+        for _ in range(t - 1):
+            x = (x * x) % n
+            if x == n_minus_1:
+                found = True
+                break
+
+        if not found:
+            return False
+
+    return True
+
+
+@numba.njit(cache=True, parallel=True)
+def miller_rabin_trials_u64(N, k, trials):
+    """Number of `trials` independent runs of miller_rabin_u64(N, k) that pass"""
+    passed = np.zeros(trials, dtype=np.int64)
+    for i in numba.prange(trials):
+        if miller_rabin_u64(N, k):
+            passed[i] = 1
+    return passed.sum()
@@ -1,19 +1,20 @@
 import argparse
 
-from prime_number_generation import fermat, miller_rabin
+from prime_number_generation import fermat, miller_rabin, solovay_strassen
 
 
 # This is a convenience function for main(). You don't need to touch it.
-def prime_test(N: int, k: int) -> tuple[True, True]:
-    return fermat(N, k), miller_rabin(N, k)
+def prime_test(N: int, k: int) -> tuple[True, True, True]:
+    return fermat(N, k), miller_rabin(N, k), solovay_strassen(N, k)
 
 
 def main(number: int, k: int):
-    fermat_call, miller_rabin_call = prime_test(number, k)
+    fermat_call, miller_rabin_call, solovay_strassen_call = prime_test(number, k)
 
     print(f'Is {number} prime?')
     print(f'Fermat: {fermat_call}')
     print(f'Miller-Rabin: {miller_rabin_call}')
+    print(f'Solovay-Strassen: {solovay_strassen_call}')
 
 
 if __name__ == '__main__':
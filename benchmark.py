@@ -4,7 +4,7 @@ import sys
 from typing import Callable, Dict, List, Any, Tuple, Optional
 
 def benchmark_function(func: Callable, args: Tuple = (), kwargs: Dict = {}, 
-                      runs: int = 5) -> Dict[str, Any]:
+                      runs: int = 5, keep_results: bool = False) -> Dict[str, Any]:
     """
     Run a function multiple times and calculate average execution time.
     
@@ -18,6 +18,10 @@ def benchmark_function(func: Callable, args: Tuple = (), kwargs: Dict = {},
         Keyword arguments to pass to the function
     runs : int
         Number of times to run the function
+    keep_results : bool
+        Also return the result of every run under "results". By default
+        only the last one is kept, so large results (e.g. 2048-bit primes)
+        are not all held in memory
         
     Returns:
     --------
@@ -26,17 +30,20 @@ def benchmark_function(func: Callable, args: Tuple = (), kwargs: Dict = {},
     """
     times = []
     results = []
+    last_result = None
     
     print(f"Benchmarking {func.__name__}...")
     
     for i in range(runs):
         print(f"  Run {i+1}/{runs}", end="... ")
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         result = func(*args, **kwargs)
-        end_time = time.time()
-        execution_time = (end_time - start_time) * 1000  # Convert to milliseconds
+        end_time = time.perf_counter_ns()
+        execution_time = (end_time - start_time) / 1e6  # Convert to milliseconds
         times.append(execution_time)
-        results.append(result)
+        last_result = result
+        if keep_results:
+            results.append(result)
         print(f"completed in {execution_time:.5f} ms")
     
     avg_time = sum(times) / len(times)
@@ -49,15 +56,18 @@ def benchmark_function(func: Callable, args: Tuple = (), kwargs: Dict = {},
     print(f"  Max time: {max_time:.5f} ms")
     print(f"  Total runs: {runs}")
     
-    return {
+    benchmark = {
         "function": func.__name__,
         "average_time": avg_time,
         "min_time": min_time,
         "max_time": max_time,
         "times": times,
-        "results": results,
+        "last_result": last_result,
         "runs": runs
     }
+    if keep_results:
+        benchmark["results"] = results
+    return benchmark
 
 def import_function(module_name: str, function_name: str) -> Optional[Callable]:
     """
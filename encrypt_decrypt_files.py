@@ -1,37 +1,110 @@
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from time import time
-from typing import Iterable
+from time import perf_counter_ns
+from typing import Iterable, Optional
 
-from prime_number_generation import mod_exp
+from prime_number_generation import exponent_windows, mod_exp_fixed_exp
 
-sys.setrecursionlimit(5000)
+# gmpy2 is optional, as in prime_number_generation; without it keys are
+#  plain ints
+try:
+    from gmpy2 import mpz
+except ImportError:
+    mpz = int
 
 
 def stream_chunks(message: bytes, n_bytes: int) -> Iterable[int]:
     """
     Read the message N bits at a time, returning a sequence of integers
     """
-    # First, pad the beginning with zeros so the length of the message is
-    #  a multiple of n_bytes
-    needed_zeros = n_bytes - (len(message) % n_bytes)
-    message = b'\x00' * needed_zeros + message
+    # The message is treated as if zeros were padded onto the beginning so
+    #  its length is a multiple of n_bytes (a whole chunk of zeros when it
+    #  already is). Leading zeros don't change a chunk's value, so the short
+    #  first chunk is read as is instead of copying the padded message
+    first_len = len(message) % n_bytes
+    yield int.from_bytes(message[:first_len], byteorder='big')
 
-    for chunk_number in range((len(message) // n_bytes)):
-        start = chunk_number * n_bytes
-        yield int.from_bytes(message[start:start + n_bytes], byteorder='big')
+    # memoryview slices don't copy the underlying bytes
+    view = memoryview(message)
+    for start in range(first_len, len(message), n_bytes):
+        yield int.from_bytes(view[start:start + n_bytes], byteorder='big')
 
 
 def to_bytes(integer: int, n_bytes: int) -> bytes:
     return integer.to_bytes(n_bytes, 'big')
 
 
-def read_key(key_file: Path) -> tuple[int, int, int]:
-    N, exponent = key_file.read_text().splitlines()
-    N = int(N)
-    exponent = int(exponent)
+def crt_combine(m1: int, m2: int, p: int, q: int, qinv: int) -> int:
+    """
+    Recombine m1 = m mod p and m2 = m mod q into m mod N (Garner's formula)
+    """
+    h = (qinv * (m1 - m2)) % p
+    return m2 + h * q
+
+
+@dataclass(frozen=True)
+class CRTKey:
+    """
+    The CRT form of a private key: the primes, d reduced mod p-1 and q-1,
+    q^-1 mod p, and the window recodings of dp and dq
+    """
+    p: int
+    q: int
+    dp: int
+    dq: int
+    qinv: int
+    windows_p: list[tuple[int, int]]
+    windows_q: list[tuple[int, int]]
+
+
+@dataclass(frozen=True)
+class KeyContext:
+    """
+    Everything about a key that is the same for every chunk, computed once
+    in read_key. It is small and picklable, so it is also what gets sent to
+    the worker processes
+    """
+    N: int
+    exponent: int
+    n_bytes: int
+    windows: list[tuple[int, int]]
+    crt: Optional[CRTKey] = None
+
+
+def encrypt_chunk(ctx: KeyContext, chunk: int) -> int:
+    """
+    Encrypt or decrypt one chunk with the key in `ctx`, using CRT when the
+    private key carries p and q
+    """
+    if ctx.crt is None:
+        return mod_exp_fixed_exp(chunk, ctx.exponent, ctx.windows, ctx.N)
+
+    crt = ctx.crt
+    m1 = mod_exp_fixed_exp(chunk, crt.dp, crt.windows_p, crt.p)
+    m2 = mod_exp_fixed_exp(chunk, crt.dq, crt.windows_q, crt.q)
+    return int(crt_combine(m1, m2, crt.p, crt.q, crt.qinv))
+
+
+def read_key(key_file: Path) -> KeyContext:
+    """
+    Read N and the exponent from `key_file`. Private keys written by
+    generate_keypair.py also carry p, q, dp, dq, and qinv on the following
+    lines, which enable CRT decryption
+    Numbers are stored as mpz when gmpy2 is installed, so they aren't
+    converted again for every chunk
+    """
+    N, exponent, *crt = (mpz(line) for line in key_file.read_text().splitlines())
     n_bytes = (N.bit_length() + 7) // 8
-    return n_bytes, N, exponent
+
+    crt_key = None
+    if crt:
+        p, q, dp, dq, qinv = crt
+        crt_key = CRTKey(p, q, dp, dq, qinv, exponent_windows(dp), exponent_windows(dq))
+
+    return KeyContext(N, exponent, n_bytes, exponent_windows(exponent), crt_key)
 
 
 def main(key_file: Path, message_file: Path, output_file: Path):
@@ -39,21 +112,34 @@ def main(key_file: Path, message_file: Path, output_file: Path):
     Encrypt or decrypt `message_file` and write the result in `output_file`
     """
 
-    n_bytes, N, exponent = read_key(key_file)
+    ctx = read_key(key_file)
+    n_bytes = ctx.n_bytes
 
     input_bytes = message_file.read_bytes()
 
-    start = time()
-
-    result = []
-    for chunk in stream_chunks(input_bytes, n_bytes):
-        encrypted_chunk = mod_exp(chunk, exponent, N)
-        encrypted_bytes = to_bytes(encrypted_chunk, n_bytes)
-        result.append(encrypted_bytes)
-
-    print(f'{time() - start} seconds elapsed')
-
-    output_file.write_bytes(b''.join(result).rstrip(b'\x00'))
+    start = perf_counter_ns()
+
+    # Every chunk is independent, so fan the mod_exp calls out over all cores
+    chunks = list(stream_chunks(input_bytes, n_bytes))
+    # Each output chunk goes straight to its offset in one preallocated
+    #  buffer instead of being joined from a list of bytes at the end
+    result = bytearray(len(chunks) * n_bytes)
+    with ProcessPoolExecutor() as executor:
+        encrypted_chunks = executor.map(
+            partial(encrypt_chunk, ctx),
+            chunks,
+            chunksize=64
+        )
+        for i, encrypted_chunk in enumerate(encrypted_chunks):
+            result[i * n_bytes:(i + 1) * n_bytes] = to_bytes(encrypted_chunk, n_bytes)
+
+    print(f'{(perf_counter_ns() - start) / 1e9} seconds elapsed')
+
+    # Drop trailing zeros without copying the buffer
+    end = len(result)
+    while end > 0 and result[end - 1] == 0:
+        end -= 1
+    output_file.write_bytes(memoryview(result)[:end])
 
 
 if __name__ == '__main__':
@@ -1,5 +1,5 @@
 import sys
-from time import time
+from time import perf_counter_ns
 
 from prime_number_generation import generate_large_prime
 
@@ -43,9 +43,28 @@ def generate_key_pairs(n_bits) -> tuple[int, int, int]:
     Computes e and d such that e*d = 1 mod (p-1)(q-1)
     Return N, e, and d
     """
+    N, e, d, p, q = generate_crt_key_pairs(n_bits)
+    return (N, e, d)
+
+
+def generate_crt_key_pairs(n_bits) -> tuple[int, int, int, int, int]:
+    """
+    Same as generate_key_pairs, but also returns the primes p and q so the
+    private key can be saved in CRT form
+    Return N, e, d, p, and q
+    """
+
+    # With the top two bits and the low bit forced, 4 bits leaves 13 as the
+    #  only prime, so p and q could never differ
+    if n_bits <= 4:
+        raise ValueError(f'n_bits must be at least 5 to get two distinct primes, got {n_bits}')
 
     p = generate_large_prime(n_bits)
     q = generate_large_prime(n_bits)
+    # At small sizes there are only a handful of candidate primes, and p == q
+    #  would leave q with no inverse mod p
+    while q == p:
+        q = generate_large_prime(n_bits)
 
     e_counter = 0
 
@@ -63,7 +82,7 @@ def generate_key_pairs(n_bits) -> tuple[int, int, int]:
 
     d = y % phi 
 
-    return (N, e, d)
+    return (N, e, d, p, q)
 
 def extended_euclid(a, b) -> tuple[int, int, int]:
     if b == 0:
@@ -74,9 +93,17 @@ def extended_euclid(a, b) -> tuple[int, int, int]:
 
 
 def main(n_bits: int, filename_stem: str):
-    start = time()
-    N, e, d = generate_key_pairs(n_bits)
-    print(f'{time() - start} seconds elapsed')
+    start = perf_counter_ns()
+    N, e, d, p, q = generate_crt_key_pairs(n_bits)
+    print(f'{(perf_counter_ns() - start) / 1e9} seconds elapsed')
+
+    # Precomputed CRT values so decryption can work mod p and mod q
+    #  separately instead of mod N
+    dp = d % (p - 1)
+    dq = d % (q - 1)
+    # extended_euclid is recursive and would go ~1200 levels deep on two
+    #  2048-bit primes, past Python's default recursion limit
+    qinv = pow(q, -1, p)
 
     public_file = filename_stem + '.public.txt'
     with open(public_file, 'w') as file:
@@ -92,7 +119,9 @@ def main(n_bits: int, filename_stem: str):
         file.writelines([
             str(N),
             '\n',
-            str(d)
+            str(d),
+            '\n',
+            '\n'.join(str(value) for value in (p, q, dp, dq, qinv))
         ])
     print(private_file, 'written')
 
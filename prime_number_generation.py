@@ -1,21 +1,137 @@
 from math import floor
 import sys
-from time import time
+from time import perf_counter_ns
 import random
-sys.setrecursionlimit(4000)
+
+__all__ = [
+    'SMALL_PRIMES',
+    'DETERMINISTIC_WITNESSES',
+    'mod_exp',
+    'exponent_windows',
+    'mod_exp_windows',
+    'mod_exp_fixed_exp',
+    'fermat',
+    'jacobi',
+    'solovay_strassen',
+    'miller_rabin',
+    'generate_large_prime',
+]
+
+def _sieve(limit: int) -> list[int]:
+    """Return the odd primes below `limit` (sieve of Eratosthenes)"""
+    is_prime = bytearray([1]) * limit
+    is_prime[0:2] = b'\x00\x00'
+    for i in range(2, int(limit ** 0.5) + 1):
+        if is_prime[i]:
+            is_prime[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return [p for p in range(3, limit) if is_prime[p]]
+
+
+# Odd primes used to cheaply reject candidates before any modular
+# exponentiation is done. Candidates are always odd, so 2 is left out.
+SMALL_PRIMES = _sieve(2000)
+
+
+def _square_and_multiply(x: int, y: int, N: int) -> int:
+    # Left-to-right binary exponentiation: walk the bits of y from the most
+    # significant end, squaring every step and multiplying in x on 1 bits.
+    # Iterative, so no recursion limit and no stack frame per bit.
+    if y == 0:
+        return 1
+
+    result = 1
+    x = x % N
+    for bit in bin(y)[2:]:
+        result = (result * result) % N
+        if bit == '1':
+            result = (result * x) % N
+
+    return result
+
+
+# gmpy2 wraps GMP, whose multiplication and modular exponentiation are much
+#  faster than CPython's for RSA-sized numbers. It is optional: without it
+#  mpz is plain int and powmod is the square-and-multiply loop above.
+try:
+    from gmpy2 import mpz, powmod
+    _HAVE_GMPY2 = True
+except ImportError:
+    _HAVE_GMPY2 = False
+    mpz = int
+    powmod = _square_and_multiply
 
 
 # You will need to implement this function and change the return value.
 def mod_exp(x: int, y: int, N: int) -> int:
     if y == 0:
         return 1
-    
-    z = mod_exp(x, (y//2), N)
+    return int(powmod(mpz(x), mpz(y), mpz(N)))
 
-    if (y % 2 == 0):
-        return ((z * z) % N)
-    else:
-        return ((x * z * z) % N)
+
+def exponent_windows(y: int, w: int = 5) -> list[tuple[int, int]]:
+    """
+    Recode y for left-to-right sliding-window exponentiation.
+    Returns (squarings, digit) pairs, most significant first: square the
+    running result `squarings` times, then multiply by x^digit. Every
+    digit is odd and below 2^w, or 0 for trailing squarings only
+    """
+    bits = bin(y)[2:] if y else ''
+    windows = []
+    squarings = 0
+    i = 0
+    while i < len(bits):
+        if bits[i] == '0':
+            squarings += 1
+            i += 1
+            continue
+        # Take up to w bits, shrinking the window until it ends in a 1
+        j = min(i + w, len(bits))
+        while bits[j - 1] == '0':
+            j -= 1
+        windows.append((squarings + j - i, int(bits[i:j], 2)))
+        squarings = 0
+        i = j
+    if squarings:
+        windows.append((squarings, 0))
+    return windows
+
+
+def mod_exp_windows(x: int, windows: list[tuple[int, int]], N: int) -> int:
+    """
+    x^y mod N, where windows = exponent_windows(y). Uses a table of the odd
+    powers x, x^3, x^5, ... so there is one multiply per window instead of
+    one per 1 bit
+    """
+    if not windows:
+        return 1
+
+    x = x % N
+    x_squared = (x * x) % N
+    table = [x]
+    for _ in range(max(digit for _, digit in windows) >> 1):
+        table.append((table[-1] * x_squared) % N)
+
+    # The first window starts from 1, so its squarings can be skipped
+    result = table[windows[0][1] >> 1]
+    for squarings, digit in windows[1:]:
+        for _ in range(squarings):
+            result = (result * result) % N
+        if digit:
+            result = (result * table[digit >> 1]) % N
+
+    return result
+
+
+def mod_exp_fixed_exp(x: int, y: int, windows: list[tuple[int, int]], N: int) -> int:
+    """
+    x^y mod N for callers that raise many x to the same y, e.g. every chunk
+    of a file with one key, and so can compute windows = exponent_windows(y)
+    once up front. With gmpy2 installed GMP's powmod is faster still and
+    the windows are not needed
+    """
+    if _HAVE_GMPY2:
+        return int(powmod(mpz(x), y, N))
+    return mod_exp_windows(x, windows, N)
 
 
 def fermat(N: int, k: int) -> bool:
@@ -24,16 +140,87 @@ def fermat(N: int, k: int) -> bool:
     """
     if N <= 1:
         return True
+    N = mpz(N)
     for i in range(k):
         a = random.randint(1, N-1)
-        if not (mod_exp(a, N-1, N) == 1):
+        if not (powmod(a, N-1, N) == 1):
             return False
         
     return True
 
-def miller_rabin(N: int, k: int) -> bool:
+def jacobi(a: int, n: int) -> int:
+    """
+    Jacobi symbol (a/n) for odd n > 0, computed iteratively with quadratic
+    reciprocity: only shifts, mods, and swaps, no factoring of n
+    """
+    a = a % n
+    result = 1
+    while a != 0:
+        # (2/n) = -1 exactly when n is 3 or 5 mod 8
+        while a % 2 == 0:
+            a = a // 2
+            if n % 8 in (3, 5):
+                result = -result
+        # Reciprocity: flip the sign when both are 3 mod 4
+        a, n = n, a
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+        a = a % n
+    return result if n == 1 else 0
+
+
+def solovay_strassen(N: int, k: int) -> bool:
+    """
+    Returns True if N is prime
+    Like Fermat, but checks a^((N-1)/2) against the Jacobi symbol (a/N)
+    rather than a^(N-1) against 1. Each round costs one modular
+    exponentiation, as in Fermat, but Carmichael numbers can't fool it:
+    a composite passes a round with probability at most 1/2
+    """
+    if N <= 1:
+        return False
+    if N <= 3:
+        return True
+    if N % 2 == 0:
+        return False
+    N = mpz(N)
+    half = (N - 1) // 2
+    for i in range(k):
+        a = random.randint(2, N-1)
+        j = jacobi(a, N)
+        if j == 0 or powmod(a, half, N) != j % N:
+            return False
+
+    return True
+
+
+def _decompose(N: int) -> tuple[int, int]:
+    """
+    Write N - 1 as 2^t * u with u odd and return (t, u). The lowest set bit
+    of N - 1 is isolated with (N - 1) & -(N - 1), so t is found in one step
+    instead of halving u in a loop
+    """
+    N_minus_1 = N - 1
+    t = (N_minus_1 & -N_minus_1).bit_length() - 1
+    return t, N_minus_1 >> t
+
+
+# (bound, witnesses): Miller-Rabin using just these witnesses has no false
+#  positives for any N below the bound (Jaeschke 1993; Sorenson & Webster
+#  2015), so it can replace k random rounds
+DETERMINISTIC_WITNESSES = [
+    (3825123056546413051, [2, 3, 5, 7, 11, 13, 17, 19, 23]),
+    (318665857834031151167461, [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37]),
+    (3317044064679887385961981, [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]),
+]
+
+
+def miller_rabin(N: int, k: int, deterministic: bool = True) -> bool:
     """
     Returns True if N is prime
+    Below 3.3 * 10^24 (which covers every 64-bit N) a fixed witness set
+    makes the answer exact and k is ignored. Pass deterministic=False to
+    always use k random witnesses, e.g. to measure how often they are fooled
     """
     if N <= 1:
         return False
@@ -41,24 +228,31 @@ def miller_rabin(N: int, k: int) -> bool:
         return True              # 2,3 are prime
     if N % 2 == 0:
         return False 
-    t = 0
-    u = N - 1
-    while (u % 2 == 0):
-        u = u // 2
-        t = t + 1
+    N = mpz(N)
+    # N - 1 is compared against after every squaring, so build it once
+    N_minus_1 = N - 1
+    t, u = _decompose(N)
+
+    for bound, witnesses in DETERMINISTIC_WITNESSES if deterministic else []:
+        if N < bound:
+            break
+    else:
+        witnesses = (random.randint(2, N-2) for i in range(k))
     
-    for i in range(k):
-        a = random.randint(2, N-2)
-        x = mod_exp(a, u, N)
+    for a in witnesses:
+        # Only happens when N is itself one of the fixed witnesses
+        if a % N == 0:
+            continue
+        x = powmod(a, u, N)
 
-        if x == 1 or x == N-1:
+        if x == 1 or x == N_minus_1:
             continue
         
         found = False
 
         for j in range(t-1):
             x = (x * x) % N
-            if x == N-1:
+            if x == N_minus_1:
                 found = True
                 break
         
@@ -68,19 +262,79 @@ def miller_rabin(N: int, k: int) -> bool:
     return True
 
 
+def _sieve_window(N0: int, size: int) -> bytearray:
+    """
+    Mark which of the odd numbers N0, N0 + 2, ..., N0 + 2 * (size - 1) have
+    a factor in SMALL_PRIMES. N0 % p is computed once per prime; after that
+    the multiples of p are every p-th entry, so no candidate is divided
+    """
+    composite = bytearray(size)
+    for p in SMALL_PRIMES:
+        # First i with N0 + 2i = 0 (mod p); (p + 1) // 2 is the inverse of 2
+        i = (-int(N0 % p) * ((p + 1) // 2)) % p
+        if N0 + 2 * i == p:
+            i += p               # p itself is prime
+        composite[i::p] = b'\x01' * len(range(i, size, p))
+    return composite
+
+
+def _miller_rabin_rounds(n_bits: int) -> int:
+    """
+    Number of Miller-Rabin rounds needed for a random n_bits candidate to be
+    composite with probability below 2^-128 (Damgard-Landrock-Pomerance
+    average-case bounds, the same table OpenSSL uses)
+    """
+    if n_bits >= 3747:
+        return 3
+    if n_bits >= 1345:
+        return 4
+    if n_bits >= 476:
+        return 5
+    if n_bits >= 400:
+        return 6
+    if n_bits >= 347:
+        return 7
+    if n_bits >= 308:
+        return 8
+    if n_bits >= 55:
+        return 27
+    return 34
+
+
 def generate_large_prime(n_bits: int) -> int:
     """Generate a random prime number with the specified bit length"""
 
+    # The top two bits are always set, so at least 2 bits are needed
+    if n_bits < 2:
+        raise ValueError(f'n_bits must be at least 2, got {n_bits}')
+
+    # Search a window of consecutive odd numbers from a random start. The
+    #  expected gap between n_bits primes is about 0.7 * n_bits, so a window
+    #  of n_bits odd numbers usually holds one
+    window = max(n_bits, 64)
+    rounds = _miller_rabin_rounds(n_bits)
+
     while(True):
-        N = random.getrandbits(n_bits)
-        if (fermat(N, 20)):
-            return N
+        # Force the top two bits so N has exactly n_bits and p*q has exactly
+        #  2*n_bits, and the low bit so N is odd
+        N0 = random.getrandbits(n_bits) | 1 | (1 << (n_bits - 1)) | (1 << (n_bits - 2))
+        # Sieving the whole window rejects most composites for far less than
+        # the cost of a single Miller-Rabin round
+        composite = _sieve_window(mpz(N0), window)
+        for i in range(window):
+            if composite[i]:
+                continue
+            N = mpz(N0 + 2 * i)
+            if N.bit_length() != n_bits:
+                break
+            if (miller_rabin(N, rounds)):
+                return int(N)
 
 def main(n_bits: int):
-    start = time()
+    start = perf_counter_ns()
     large_prime = generate_large_prime(n_bits)
     print(large_prime)
-    print(f'Generation took {time() - start} seconds')
+    print(f'Generation took {(perf_counter_ns() - start) / 1e9} seconds')
 
 
 if __name__ == '__main__':
@@ -4,6 +4,13 @@ import argparse
 from prime_number_generation import fermat, miller_rabin
 from collections import defaultdict
 import matplotlib.pyplot as plt
+import numpy as np
+
+# Numba is optional; without it Miller-Rabin trials run through miller_rabin
+try:
+    from _mr_u64 import miller_rabin_trials_u64
+except ImportError:
+    miller_rabin_trials_u64 = None
 
 # Some well-known Carmichael numbers (composite numbers that can fool Fermat test)
 CARMICHAEL_NUMBERS = [
@@ -16,6 +23,38 @@ CARMICHAEL_NUMBERS = [
     8911,   # 7 * 19 * 67
 ]
 
+def mod_exp_vectorized(x, y, N):
+    """
+    Elementwise x^y mod N over a uint64 array (right-to-left binary).
+    Only valid for N < 2^32, so that products of two residues fit in uint64
+    """
+    result = np.ones_like(x)
+    x = x % np.uint64(N)
+    while y > 0:
+        if y & 1:
+            result = (result * x) % np.uint64(N)
+        x = (x * x) % np.uint64(N)
+        y >>= 1
+    return result
+
+
+def fermat_false_positives_vectorized(number, max_k, trials):
+    """
+    Count, for each k, how many of `trials` runs of fermat(number, k) pass.
+    All k witnesses of all trials are checked in a single NumPy call per k
+    instead of k * trials calls to mod_exp
+    """
+    rng = np.random.default_rng()
+    false_positives = defaultdict(int)
+    for k in range(1, max_k + 1):
+        # Same witness range as fermat: 1 <= a <= number - 1
+        a = rng.integers(1, number, size=(trials, k), dtype=np.uint64)
+        passed = (mod_exp_vectorized(a, number - 1, number) == 1).all(axis=1)
+        count = int(passed.sum())
+        if count:
+            false_positives[k] = count
+    return false_positives
+
 def test_primality_iterations(number, max_k=100, trials=100):
     """
     Test a number with both Fermat and Miller-Rabin for multiple values of k and trials
@@ -23,19 +62,30 @@ def test_primality_iterations(number, max_k=100, trials=100):
     """
     fermat_false_positives = defaultdict(int)
     miller_rabin_false_positives = defaultdict(int)
+
+    # Small numbers fit in uint64, so the Fermat trials can be vectorized
+    #  and the Miller-Rabin trials run in compiled code
+    vectorize_fermat = number < (1 << 32)
+    compile_miller_rabin = vectorize_fermat and miller_rabin_trials_u64 is not None
+    if vectorize_fermat:
+        fermat_false_positives = fermat_false_positives_vectorized(number, max_k, trials)
     
     # Test with different k values
     for k in range(1, max_k + 1):
+        if compile_miller_rabin:
+            count = miller_rabin_trials_u64(number, k, trials)
+            if count:
+                miller_rabin_false_positives[k] = int(count)
+            # Fermat trials were already vectorized above
+            continue
+
         # Run multiple trials for each k to account for randomness
         for _ in range(trials):
-            fermat_result = fermat(number, k)
-            miller_rabin_result = miller_rabin(number, k)
-            
             # For composite numbers, a "True" result is a false positive
-            if fermat_result:  # If Fermat says it's prime (which is wrong for Carmichael)
+            if not vectorize_fermat and fermat(number, k):  # If Fermat says it's prime (which is wrong for Carmichael)
                 fermat_false_positives[k] += 1
             
-            if miller_rabin_result:  # If Miller-Rabin says it's prime (which is wrong)
+            if not compile_miller_rabin and miller_rabin(number, k, deterministic=False):  # If Miller-Rabin says it's prime (which is wrong)
                 miller_rabin_false_positives[k] += 1
     
     # Convert to probabilities
@@ -1,13 +1,14 @@
 # ---------------------------------- Imports --------------------------------- #
 import random
 
+import pytest
 from byu_pytest_utils import tier
 
-from prime_number_generation import mod_exp, fermat, miller_rabin
+from prime_number_generation import mod_exp, fermat, miller_rabin, exponent_windows, mod_exp_windows, jacobi, \
+    solovay_strassen, generate_large_prime
 from generate_keypair import generate_key_pairs
-
-import sys
-sys.setrecursionlimit(4000)
+from encrypt_decrypt_files import encrypt_chunk, read_key, stream_chunks
+import generate_keypair
 
 # -------------------------------- Test tiers -------------------------------- #
 baseline = tier('baseline', 1)
@@ -39,6 +40,15 @@ def test_mod_exp() -> None:
         assert mod_exp(x, y, N) == expected
 
 
+@baseline
+def test_mod_exp_windows() -> None:
+    for x, y, N, expected in mod_exp_args:
+        assert mod_exp_windows(x, exponent_windows(y), N) == expected
+    for w in [1, 3, 5]:
+        y = random.getrandbits(512)
+        assert mod_exp_windows(7, exponent_windows(y, w), 10 ** 40 + 1) == mod_exp(7, y, 10 ** 40 + 1)
+
+
 @baseline
 def test_primes_fermat() -> None:
     """This function tests multiple known prime numbers to verify that your fermat
@@ -85,6 +95,105 @@ def test_key_pair_encoding_decoding():
         ), f"Failed for bit size {bits}: message={message}, decrypted_message={decrypted_message}"
 
 
+@core
+def test_crt_decryption(tmp_path):
+    """
+    Test that read_key parses a 7-line private key file into its CRT form,
+    and that encrypt_chunk decrypts with it, matching the plain 2-line key
+    """
+
+    for bits in [64, 128, 256, 512]:
+        stem = str(tmp_path / f'key{bits}')
+        generate_keypair.main(bits, stem)
+        public = read_key(tmp_path / f'key{bits}.public.txt')
+        private = read_key(tmp_path / f'key{bits}.private.txt')
+
+        # The same private key without the CRT lines
+        plain_file = tmp_path / f'key{bits}.plain.txt'
+        plain_file.write_text('\n'.join((tmp_path / f'key{bits}.private.txt').read_text().splitlines()[:2]))
+        plain = read_key(plain_file)
+
+        assert public.crt is None and plain.crt is None
+        crt = private.crt
+        assert crt is not None and crt.p * crt.q == private.N == public.N
+        assert crt.windows_p == exponent_windows(crt.dp)
+        assert crt.windows_q == exponent_windows(crt.dq)
+
+        message: int = random.getrandbits(2 * bits - 1)
+        ciphertext = encrypt_chunk(public, message)
+        assert ciphertext == mod_exp(message, public.exponent, public.N)
+
+        assert mod_exp_windows(ciphertext, crt.windows_p, crt.p) == mod_exp(ciphertext, crt.dp, crt.p)
+        assert mod_exp_windows(ciphertext, crt.windows_q, crt.q) == mod_exp(ciphertext, crt.dq, crt.q)
+        assert encrypt_chunk(private, ciphertext) == encrypt_chunk(plain, ciphertext) == message
+
+
+@core
+def test_generate_large_prime_bit_length():
+    """
+    Test that generated primes have exactly the requested number of bits, and
+    that bit lengths too small for the top-bit forcing are rejected
+    """
+
+    for bits in [2, 3, 8, 64, 512]:
+        assert generate_large_prime(bits).bit_length() == bits
+    for bits in [0, 1]:
+        with pytest.raises(ValueError):
+            generate_large_prime(bits)
+
+
+@core
+def test_generate_keypair_files(tmp_path):
+    """
+    Test that generate_keypair.main writes 2048-bit key files with valid CRT
+    values under Python's default recursion limit
+    """
+
+    stem = str(tmp_path / 'key')
+    generate_keypair.main(2048, stem)
+
+    N, e = (int(line) for line in (tmp_path / 'key.public.txt').read_text().splitlines())
+    private = [int(line) for line in (tmp_path / 'key.private.txt').read_text().splitlines()]
+    assert len(private) == 7
+    N_private, d, p, q, dp, dq, qinv = private
+
+    assert N_private == N == p * q
+    assert (e * d) % ((p - 1) * (q - 1)) == 1
+    assert dp == d % (p - 1) and dq == d % (q - 1)
+    assert (qinv * q) % p == 1
+
+
+@core
+def test_generate_keypair_distinct_primes(tmp_path):
+    """
+    Test that small key sizes, where only a few primes exist, still give
+    p != q, and that sizes with a single possible prime are rejected
+    """
+
+    stem = str(tmp_path / 'key')
+    for _ in range(20):
+        generate_keypair.main(8, stem)
+        N, d, p, q, dp, dq, qinv = (int(line) for line in (tmp_path / 'key.private.txt').read_text().splitlines())
+        assert p != q
+        assert (qinv * q) % p == 1
+
+    for bits in [2, 3, 4]:
+        with pytest.raises(ValueError):
+            generate_keypair.generate_crt_key_pairs(bits)
+
+
+@core
+def test_stream_chunks():
+    """
+    Test that the message is split into n_bytes chunks after left-padding it
+    with zeros to a multiple of n_bytes (a whole zero chunk if it already is)
+    """
+
+    message = bytes(range(1, 11))
+    assert list(stream_chunks(message, 4)) == [0x0102, 0x03040506, 0x0708090a]
+    assert list(stream_chunks(message, 5)) == [0, 0x0102030405, 0x060708090a]
+
+
 # ------------------------------ Stretch 2 Tests ----------------------------- #
 @stretch2
 def test_primes_miller_rabin() -> None:
@@ -102,3 +211,93 @@ def test_composites_miller_rabin() -> None:
     for N in composite_args:
         call = miller_rabin(N, 100)
         assert call == False
+
+
+@stretch2
+def test_deterministic_miller_rabin() -> None:
+    """This function checks the fixed witness sets used for N < 3.3 * 10^24:
+    strong pseudoprimes to the smaller prime bases must be rejected, and
+    primes just below each bound must pass, whatever k is"""
+    # Strong pseudoprimes to every prime base up to 7, 19, 31, and 37
+    strong_pseudoprimes = [3215031751, 341550071728321, 3825123056546413051, 318665857834031151167461]
+    for N in strong_pseudoprimes:
+        assert miller_rabin(N, 1) == False
+
+    # The largest prime below each bound
+    for N in [3825123056546412979, 318665857834031151167441, 3317044064679887385961813]:
+        assert miller_rabin(N, 1) == True
+
+
+@stretch2
+def test_jacobi() -> None:
+    """This function checks the Jacobi symbol against a few known values"""
+    assert [jacobi(a, 7) for a in range(7)] == [0, 1, 1, -1, 1, -1, -1]
+    assert jacobi(1001, 9907) == -1
+    assert jacobi(19, 45) == 1
+    assert jacobi(21, 45) == 0
+
+
+@stretch2
+def test_solovay_strassen() -> None:
+    """This function tests known primes, composites, and Carmichael numbers to
+    verify that solovay_strassen tells them apart"""
+    for N in prime_args:
+        assert solovay_strassen(N, 100) == True
+    for N in composite_args + [561, 1105, 1729, 2465, 2821, 6601, 8911]:
+        assert solovay_strassen(N, 100) == False
+
+
+@stretch2
+def test_mod_exp_vectorized() -> None:
+    """This function checks the NumPy modular exponentiation behind the
+    Carmichael Fermat experiments against pow"""
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("matplotlib")
+    from test_carmichael import mod_exp_vectorized
+
+    for N in [561, 8911, 4294967291]:
+        x = np.array([0, 1, 2, 3, 123, N - 2, N - 1], dtype=np.uint64) % np.uint64(N)
+        for y in [0, 1, 2, 19, N - 1]:
+            expected = [pow(int(a), y, N) for a in x]
+            assert [int(v) for v in mod_exp_vectorized(x, y, N)] == expected
+
+
+@stretch2
+def test_fermat_false_positives_vectorized() -> None:
+    """This function tests that the vectorized Fermat trials pass every trial
+    for a prime, at every k"""
+    pytest.importorskip("numpy")
+    pytest.importorskip("matplotlib")
+    from test_carmichael import fermat_false_positives_vectorized
+
+    for N in [7, 8923, 4294967291]:
+        counts = fermat_false_positives_vectorized(N, 10, 50)
+        assert dict(counts) == {k: 50 for k in range(1, 11)}
+
+
+
+@stretch2
+def test_mod_exp_u64() -> None:
+    """This function checks the Numba modular exponentiation behind the
+    Carmichael Miller-Rabin experiments against pow"""
+    pytest.importorskip("numba")
+    import numpy as np
+    from _mr_u64 import mod_exp_u64
+
+    for N in [561, 8911, 4294967291]:
+        for a in [0, 1, 2, 3, 123, N - 2, N - 1]:
+            for y in [0, 1, 2, 19, N - 1]:
+                assert int(mod_exp_u64(np.uint64(a), np.uint64(y), np.uint64(N))) == pow(a, y, N)
+
+
+@stretch2
+def test_miller_rabin_trials_u64() -> None:
+    """This function tests that the compiled Miller-Rabin trials pass every
+    trial for a prime and reject an even composite every time"""
+    pytest.importorskip("numba")
+    from _mr_u64 import miller_rabin_trials_u64
+
+    for N in [5, 8923, 4294967291]:
+        for k in [1, 5, 20]:
+            assert miller_rabin_trials_u64(N, k, 200) == 200
+    assert miller_rabin_trials_u64(8910, 5, 200) == 0